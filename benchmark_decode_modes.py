@@ -0,0 +1,148 @@
+"""
+Decode Mode Benchmark
+
+Compares the keyframe-only and reduced-resolution detection modes of the
+detection API against full decoding on a long synthetic video.
+'reduced-detect' still decodes every frame it samples at full resolution,
+so it only saves face detection time.
+
+Usage:
+    python benchmark_decode_modes.py --minutes 60 --width 1920 --height 1080
+    python benchmark_decode_modes.py --minutes 60 --gop 250   # needs ffmpeg on PATH
+"""
+
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+from deepfake_detection_api import (
+    open_video, read_sampled_frames, extract_faces, probe_video, choose_decode_mode, estimate_decoded_frames
+)
+
+MODES = ['full', 'keyframe', 'reduced-detect']
+MIN_FRAME_RATIO = 0.75  # A mode sampling fewer frames than this share of full decode fails
+
+
+def write_synthetic_video(path, minutes, width, height, fps):
+    """Write a long synthetic video with OpenCV by looping a small set of noisy frames"""
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height))
+    if not writer.isOpened():
+        raise RuntimeError(f"Could not open video writer for {path}")
+
+    # Pre-render a short loop so generation is bound by encoding, not drawing
+    rng = np.random.default_rng(42)
+    gradient = np.tile(np.linspace(0, 255, width, dtype=np.uint8), (height, 1))
+    loop = []
+    for i in range(int(fps)):
+        frame = cv2.merge([np.roll(gradient, i * 8, axis=1), gradient, np.fliplr(gradient)])
+        noise = rng.integers(0, 32, size=frame.shape, dtype=np.uint8)
+        loop.append(cv2.add(frame, noise))
+
+    total_frames = int(minutes * 60 * fps)
+    for i in range(total_frames):
+        writer.write(loop[i % len(loop)])
+    writer.release()
+    return total_frames
+
+
+def write_synthetic_video_ffmpeg(path, minutes, width, height, fps, gop):
+    """Write a long synthetic H.264 video with a fixed GOP using the ffmpeg CLI"""
+    ffmpeg = shutil.which('ffmpeg')
+    if ffmpeg is None:
+        raise RuntimeError("--gop needs ffmpeg on PATH")
+    subprocess.run([
+        ffmpeg, '-loglevel', 'error', '-y',
+        '-f', 'lavfi', '-i', f"testsrc2=size={width}x{height}:rate={fps}",
+        '-t', str(minutes * 60),
+        '-c:v', 'libx264', '-preset', 'ultrafast', '-g', str(gop), '-pix_fmt', 'yuv420p',
+        path
+    ], check=True)
+
+
+def benchmark_mode(path, mode, probe, face_detector):
+    """Time sampling (decode) and face extraction (detect) separately in one decode mode"""
+    detect = 0.0
+    decoded = 0
+    start = time.perf_counter()
+    cap = open_video(path, mode)
+    for _, frame in read_sampled_frames(cap, probe['frameCount'], probe['fps'], mode):
+        decoded += 1
+        detect_start = time.perf_counter()
+        extract_faces(frame, face_detector)
+        detect += time.perf_counter() - detect_start
+    cap.release()
+    return time.perf_counter() - start - detect, detect, decoded
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark video decode modes")
+    parser.add_argument('--minutes', type=float, default=30)
+    parser.add_argument('--width', type=int, default=1920)
+    parser.add_argument('--height', type=int, default=1080)
+    parser.add_argument('--fps', type=float, default=25)
+    parser.add_argument('--gop', type=int, help="Encode H.264 with this GOP via ffmpeg instead of OpenCV's mp4v")
+    parser.add_argument('--video', help="Benchmark an existing video instead of generating one")
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    path = args.video
+    if path is None:
+        codec = f"h264_gop{args.gop}" if args.gop else "mp4v"
+        name = f"synthetic_{codec}_{args.width}x{args.height}_{args.minutes}m.mp4"
+        path = os.path.join(tempfile.gettempdir(), name)
+        if not os.path.exists(path):
+            print(f"Generating {args.minutes} minute synthetic video at {args.width}x{args.height}...")
+            if args.gop:
+                write_synthetic_video_ffmpeg(path, args.minutes, args.width, args.height, args.fps, args.gop)
+            else:
+                write_synthetic_video(path, args.minutes, args.width, args.height, args.fps)
+
+    probe = probe_video(path)
+    if probe is None:
+        print(f"Error: could not open {path}")
+        sys.exit(1)
+
+    print(f"Video: {path}")
+    print(f"  {probe['codec']} {probe['width']}x{probe['height']}, {probe['frameCount']} frames, "
+          f"{probe['duration']:.0f}s, GOP {probe['gopFrames']}")
+    print(f"  auto mode would choose: {choose_decode_mode(probe)}")
+
+    face_detector = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+
+    baseline = None
+    failures = []
+    print(f"{'mode':<16}{'decode (s)':>11}{'detect (s)':>11}{'frames':>8}{'est. work':>11}{'speedup':>9}")
+    for mode in MODES:
+        runs = [benchmark_mode(path, mode, probe, face_detector) for _ in range(args.repeat)]
+        counts = {decoded for _, _, decoded in runs}
+        if len(counts) != 1:
+            failures.append(f"{mode}: frame count changed between repeats {sorted(counts)}")
+        decoded = min(counts)
+
+        # Best total run, reported with its decode and detection split
+        decode, detect, _ = min(runs, key=lambda run: run[0] + run[1])
+        total = decode + detect
+        if baseline is None:
+            baseline = (total, decoded)
+        elif decoded < MIN_FRAME_RATIO * baseline[1]:
+            failures.append(f"{mode}: sampled {decoded} frames, full decode sampled {baseline[1]}")
+
+        work = estimate_decoded_frames(probe, mode)
+        print(f"{mode:<16}{decode:>11.2f}{detect:>11.2f}{decoded:>8}{work:>11.0f}{baseline[0] / total:>8.1f}x")
+
+    # A mode that drops samples is not faster, it is broken
+    if failures:
+        for failure in failures:
+            print(f"FAIL {failure}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
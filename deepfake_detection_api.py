@@ -23,6 +23,10 @@ import uuid
 from datetime import datetime
 import time
 import json
+import math
+import threading
+import itertools
+import queue
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
@@ -33,7 +37,55 @@ UPLOAD_FOLDER = "uploads"
 RESULT_FOLDER = "results"
 GENERATION_FOLDER = "generated"
 ALLOWED_EXTENSIONS = {'mp4', 'avi', 'mov', 'webm', 'jpg', 'jpeg', 'png'}
+UPLOAD_HEADER_BYTES = 12  # Leading bytes checked for a known file signature before saving
+QUICKTIME_ATOMS = {b'ftyp', b'moov', b'mdat', b'wide', b'free', b'skip'}  # MP4/MOV, bytes 4-8
+EBML_MAGIC = b'\x1a\x45\xdf\xa3'  # WebM/Matroska
+JPEG_MAGIC = b'\xff\xd8\xff'
+PNG_MAGIC = b'\x89PNG\r\n\x1a\n'
 IMAGE_SIZE = (224, 224)
+PREDICT_BATCH_SIZE = 32  # Max face crops per model call
+BATCH_BUFFER_POOL_SIZE = 4  # Preallocated face batch buffers shared by all requests
+
+# Decode modes: 'auto' picks one from the probed frame count and GOP. OpenCV
+# can't decode at reduced resolution, so 'reduced-detect' decodes in full and
+# only runs face detection on downscaled frames
+DECODE_MODES = ('auto', 'full', 'keyframe', 'reduced-detect')
+REDUCED_MAX_HEIGHT = 720  # Rows 'reduced-detect' downscales taller frames to
+GOP_PROBE_MAX_PACKETS = 600  # Packets scanned for the second keyframe when probing
+ASSUMED_GOP_FRAMES = 250  # GOP used when the backend can't report keyframes (x264 default)
+SEEK_PREROLL_FRAMES = 16  # OpenCV's FFmpeg seek starts decoding this far before the target
+KEYFRAME_DECODE_WEIGHT = 4  # Decoding a keyframe costs about this many inter frames
+
+# FFmpeg backend options applied when opening the capture for each mode. OpenCV
+# only hands these to the demuxer, so decoder options such as skip_frame or
+# lowres have no effect; avdiscard is applied to the video stream itself.
+CAPTURE_OPTIONS_ENV = "OPENCV_FFMPEG_CAPTURE_OPTIONS"
+DECODE_CAPTURE_OPTIONS = {
+    'keyframe': "avdiscard;nonkey"
+}
+
+# Admission control
+SAMPLED_FRAMES = 20  # Frames sampled per video at full quality
+DOWNGRADE_MIN_FRAMES = 5  # Fewest frames a downgraded analysis may sample
+ADMIT_COST_SECONDS = 10  # Analyses estimated over this are downgraded or queued
+MAX_CONCURRENT_ANALYSES = 2  # Analyses of any cost running at once
+MAX_HEAVY_ANALYSES = 1  # Of those, queued analyses over the admit budget
+MAX_QUEUED_ANALYSES = 8  # Analyses allowed to wait for a slot before rejecting
+QUEUE_TIMEOUT_SECONDS = 120  # Longest an analysis waits for a slot before a 503
+
+# Cost model, fitted to benchmark_decode_modes.py runs on one CPU core
+DECODE_SECONDS_PER_MEGAPIXEL = 0.0026  # One H.264 inter frame
+DETECT_SECONDS_PER_MEGAPIXEL = 0.12  # Face detection on one sampled frame
+
+# Decode cost relative to H.264 by FourCC; mp4v is measured, the rest approximate
+CODEC_COST_FACTORS = {
+    'h264': 1.0, 'avc1': 1.0,
+    'hevc': 1.6, 'hev1': 1.6, 'hvc1': 1.6,
+    'vp80': 0.8, 'vp90': 1.4, 'vp09': 1.4,
+    'av01': 2.0,
+    'fmp4': 0.4, 'mp4v': 0.4, 'xvid': 0.4, 'divx': 0.4,
+    'mjpg': 0.6
+}
 
 # Ensure directories exist
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
@@ -43,6 +95,76 @@ os.makedirs(GENERATION_FOLDER, exist_ok=True)
 # Load the trained model
 model = None
 
+# Set when a loaded model couldn't take in-graph scaling, so crops are scaled on the host
+model_input_scale = None
+
+# Preallocated uint8 face batch buffers, checked out for the length of one analysis
+_batch_buffers = queue.Queue()
+for _ in range(BATCH_BUFFER_POOL_SIZE):
+    _batch_buffers.put(np.empty((PREDICT_BATCH_SIZE, IMAGE_SIZE[1], IMAGE_SIZE[0], 3), dtype=np.uint8))
+
+# OpenCV reads FFmpeg capture options from the environment at open time
+_capture_options_lock = threading.Lock()
+
+class AnalysisQueue:
+    """Bounds concurrent analyses and hands out slots in order of estimated cost
+
+    Waiters are ordered by arrival time plus estimated cost, so cheap
+    analyses overtake expensive ones, but only those arriving less than
+    the expensive one's cost later; nothing waits behind cheaper work forever.
+    """
+
+    def __init__(self, slots, heavy_slots, max_waiting):
+        self.slots = slots
+        self.heavy_slots = heavy_slots
+        self.max_waiting = max_waiting
+        self._condition = threading.Condition()
+        self._waiting = []
+        self._counter = itertools.count()
+        self._running = 0
+        self._running_heavy = 0
+
+    def _next_runnable(self):
+        for entry in sorted(self._waiting):
+            heavy = entry[2]
+            if self._running < self.slots and (not heavy or self._running_heavy < self.heavy_slots):
+                return entry
+        return None
+
+    def acquire(self, cost, heavy=False, timeout=QUEUE_TIMEOUT_SECONDS):
+        """Block until this analysis may run; False if the queue is full or the wait times out"""
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            if len(self._waiting) >= self.max_waiting:
+                return False
+
+            entry = (time.monotonic() + cost, next(self._counter), heavy)
+            self._waiting.append(entry)
+            while self._next_runnable() != entry:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._waiting.remove(entry)
+                    self._condition.notify_all()
+                    return False
+                self._condition.wait(remaining)
+
+            self._waiting.remove(entry)
+            self._running += 1
+            if heavy:
+                self._running_heavy += 1
+            # Let the next waiter re-check in case more slots are free
+            self._condition.notify_all()
+            return True
+
+    def release(self, heavy=False):
+        with self._condition:
+            self._running -= 1
+            if heavy:
+                self._running_heavy -= 1
+            self._condition.notify_all()
+
+analysis_queue = AnalysisQueue(MAX_CONCURRENT_ANALYSES, MAX_HEAVY_ANALYSES, MAX_QUEUED_ANALYSES)
+
 # Mock techniques for detection
 TECHNIQUES = [
     {
@@ -141,25 +263,50 @@ ABNORMALITY_TYPES = [
     }
 ]
 
+def has_known_signature(header):
+    """Check the leading bytes of an upload against the formats in ALLOWED_EXTENSIONS"""
+    return (
+        header[4:8] in QUICKTIME_ATOMS
+        or header.startswith(EBML_MAGIC)
+        or (header[:4] == b'RIFF' and header[8:12] == b'AVI ')
+        or header.startswith((JPEG_MAGIC, PNG_MAGIC))
+    )
+
 def allowed_file(filename):
     """Check if the file has an allowed extension"""
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def with_rescaling(loaded_model):
+    """Prepend in-graph 1/255 scaling to models saved before it was part of the graph"""
+    from tensorflow.keras.models import Sequential
+    from tensorflow.keras.layers import Rescaling
+
+    if any(isinstance(layer, Rescaling) for layer in loaded_model.layers[:2]):
+        return loaded_model
+
+    # Older models expect [0, 1] float input; wrap them so they take raw uint8 pixels
+    return Sequential([
+        Rescaling(1.0 / 255, input_shape=(IMAGE_SIZE[1], IMAGE_SIZE[0], 3)),
+        loaded_model
+    ])
+
 def load_model():
     """Load the trained model"""
-    global model
+    global model, model_input_scale
     if model is None:
         try:
-            model = tf.keras.models.load_model(MODEL_PATH)
+            loaded_model = tf.keras.models.load_model(MODEL_PATH)
             print(f"Model loaded from {MODEL_PATH}")
         except Exception as e:
             print(f"Error loading model: {e}")
             # Fall back to creating a new model for demonstration
             from tensorflow.keras.models import Sequential
-            from tensorflow.keras.layers import Conv2D, MaxPooling2D, Flatten, Dense, Dropout
+            from tensorflow.keras.layers import Rescaling, Conv2D, MaxPooling2D, Flatten, Dense, Dropout
             
             model = Sequential([
-                Conv2D(32, (3, 3), activation='relu', input_shape=(224, 224, 3)),
+                # Normalize inside the graph so callers can feed uint8 pixels
+                Rescaling(1.0 / 255, input_shape=(224, 224, 3)),
+                Conv2D(32, (3, 3), activation='relu'),
                 MaxPooling2D((2, 2)),
                 Conv2D(64, (3, 3), activation='relu'),
                 MaxPooling2D((2, 2)),
@@ -172,10 +319,49 @@ def load_model():
             ])
             model.compile(optimizer='adam', loss='binary_crossentropy', metrics=['accuracy'])
             print("Created a new model as fallback")
+            return model
+
+        # Wrapping is separate from loading so a failure here never discards the trained model
+        try:
+            model = with_rescaling(loaded_model)
+        except Exception as e:
+            print(f"Error adding rescaling to loaded model, scaling crops on the host instead: {e}")
+            model = loaded_model
+            model_input_scale = 1.0 / 255
     return model
 
+class FaceBatch:
+    """Collects preprocessed face crops in a reusable uint8 buffer for batched prediction"""
+
+    def __init__(self, buffer):
+        self.buffer = buffer
+        self.frame_indices = []
+
+    def is_full(self):
+        return len(self.frame_indices) == len(self.buffer)
+
+    def add(self, face, frame_idx):
+        """Resize a BGR crop straight into the next slot and convert it to RGB in place"""
+        slot = self.buffer[len(self.frame_indices)]
+        cv2.resize(face, IMAGE_SIZE, dst=slot)
+        cv2.cvtColor(slot, cv2.COLOR_BGR2RGB, dst=slot)
+        self.frame_indices.append(frame_idx)
+
+    def flush(self):
+        """Predict on the buffered crops and return (frame_idx, prediction) pairs"""
+        if not self.frame_indices:
+            return []
+        count = len(self.frame_indices)
+        batch = self.buffer[:count]
+        if model_input_scale is not None:
+            batch = batch.astype(np.float32) * model_input_scale
+        predictions = model.predict_on_batch(batch)
+        results = list(zip(self.frame_indices, np.asarray(predictions)[:, 0]))
+        self.frame_indices = []
+        return results
+
 def extract_faces(image, face_detector):
-    """Extract faces from an image"""
+    """Extract face regions from an image as views into the frame (no copies)"""
     try:
         # Convert to grayscale for face detection
         gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
@@ -185,81 +371,320 @@ def extract_faces(image, face_detector):
         
         if len(faces) == 0:
             # If no face detected, use the whole image
-            face_img = cv2.resize(image, IMAGE_SIZE)
-            return [face_img]
-            
-        face_images = []
-        for (x, y, w, h) in faces:
-            # Extract face
-            face_img = image[y:y+h, x:x+w]
-            face_img = cv2.resize(face_img, IMAGE_SIZE)
-            face_images.append(face_img)
+            return [image]
             
-        return face_images
+        # Resizing happens later, directly into the batch buffer
+        return [image[y:y+h, x:x+w] for (x, y, w, h) in faces]
     except Exception as e:
         print(f"Error extracting faces: {e}")
         return []
 
-def predict_video(video_path):
+def open_capture(video_path, options=None):
+    """Open a capture with the given FFmpeg options; every capture is opened here"""
+    # OpenCV reads the options from the environment when the capture opens, so
+    # every open holds the lock and sees exactly the options it asked for
+    with _capture_options_lock:
+        previous = os.environ.pop(CAPTURE_OPTIONS_ENV, None)
+        try:
+            if options is None:
+                return cv2.VideoCapture(video_path)
+            os.environ[CAPTURE_OPTIONS_ENV] = options
+            return cv2.VideoCapture(video_path, cv2.CAP_FFMPEG)
+        finally:
+            os.environ.pop(CAPTURE_OPTIONS_ENV, None)
+            if previous is not None:
+                os.environ[CAPTURE_OPTIONS_ENV] = previous
+
+def probe_gop_frames(cap, frame_count):
+    """Count video packets between the first two keyframes without decoding them
+
+    Returns None when the backend can't read raw packets. If no second
+    keyframe turns up within the scan, the packets scanned are a lower bound.
+    """
+    if not hasattr(cv2, "CAP_PROP_LRF_HAS_KEY_FRAME") or not cap.set(cv2.CAP_PROP_FORMAT, -1):
+        return None
+
+    first_keyframe = None
+    scanned = 0
+    while scanned < min(frame_count, GOP_PROBE_MAX_PACKETS) and cap.grab():
+        if cap.get(cv2.CAP_PROP_LRF_HAS_KEY_FRAME):
+            if first_keyframe is not None:
+                return scanned - first_keyframe
+            first_keyframe = scanned
+        scanned += 1
+    return max(1, scanned - (first_keyframe or 0))
+
+def probe_video(video_path):
+    """Read video properties from the container header and the first packets
+
+    Only demuxes (never decodes) up to GOP_PROBE_MAX_PACKETS packets to find
+    the GOP length. Returns None if the file can't be opened or reports no
+    frames or size, which is how unsupported and corrupt uploads show up.
+    """
+    cap = open_capture(video_path)
+    try:
+        if not cap.isOpened():
+            return None
+
+        fourcc = int(cap.get(cv2.CAP_PROP_FOURCC))
+        frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+
+        if frame_count <= 0 or width <= 0 or height <= 0:
+            return None
+
+        return {
+            "codec": "".join(chr((fourcc >> 8 * i) & 0xFF) for i in range(4)).strip("\x00 "),
+            "frameCount": frame_count,
+            "fps": fps,
+            "duration": frame_count / fps if fps > 0 else 0,
+            "width": width,
+            "height": height,
+            "gopFrames": probe_gop_frames(cap, frame_count)
+        }
+    finally:
+        cap.release()
+
+def sample_frame_indices(frame_count, max_frames=SAMPLED_FRAMES):
+    """Frame indices sampled at regular intervals across a video"""
+    return range(0, frame_count, max(1, frame_count // max_frames))
+
+def sampled_frame_count(frame_count, max_frames):
+    """Number of frames read_sampled_frames will visit"""
+    return len(sample_frame_indices(frame_count, max_frames))
+
+def gop_frames(probe):
+    """GOP length from the probe, falling back to ASSUMED_GOP_FRAMES"""
+    return min(probe.get("gopFrames") or ASSUMED_GOP_FRAMES, probe["frameCount"])
+
+def estimate_decoded_frames(probe, decode_mode, max_frames=SAMPLED_FRAMES):
+    """Estimate the decode work of a mode, counted in inter-frame decodes"""
+    frame_count = probe["frameCount"]
+    gop = gop_frames(probe)
+
+    if decode_mode == 'keyframe':
+        # Every keyframe in the file is decoded once, in order
+        return math.ceil(frame_count / gop) * KEYFRAME_DECODE_WEIGHT
+
+    # Each seek decodes from the keyframe before (target - preroll) up to the target
+    per_seek = KEYFRAME_DECODE_WEIGHT + SEEK_PREROLL_FRAMES + gop / 2
+    return sampled_frame_count(frame_count, max_frames) * per_seek
+
+def choose_decode_mode(probe, max_frames=SAMPLED_FRAMES):
+    """Pick the cheaper decode mode for the probed frame count and GOP"""
+    keyframes = probe["frameCount"] / gop_frames(probe)
+
+    # Scanning every keyframe beats seeking once the seeks would decode more,
+    # provided there are enough keyframes to give each sample its own
+    if probe["fps"] > 0 and keyframes >= sampled_frame_count(probe["frameCount"], max_frames):
+        keyframe_cost = estimate_decoded_frames(probe, 'keyframe', max_frames)
+        if keyframe_cost < estimate_decoded_frames(probe, 'full', max_frames):
+            return 'keyframe'
+    return 'full'
+
+def estimate_cost(probe, decode_mode, max_frames=SAMPLED_FRAMES):
+    """Estimate the analysis time in seconds from the probed video parameters
+
+    Decoding scales with the frames a mode decodes (GOP length for seeks,
+    frame count for keyframe scans), the frame size and the codec; face
+    detection scales with the sampled frames at the size they're detected at.
+    """
+    width, height = probe["width"], probe["height"]
+    codec_factor = CODEC_COST_FACTORS.get(probe.get("codec", "").lower(), 1.0)
+    decode = estimate_decoded_frames(probe, decode_mode, max_frames) * width * height / 1e6
+    decode *= DECODE_SECONDS_PER_MEGAPIXEL * codec_factor
+
+    if decode_mode == 'reduced-detect' and height > REDUCED_MAX_HEIGHT:
+        width, height = width * REDUCED_MAX_HEIGHT / height, REDUCED_MAX_HEIGHT
+    frames = sampled_frame_count(probe["frameCount"], max_frames)
+    detect = frames * width * height / 1e6 * DETECT_SECONDS_PER_MEGAPIXEL
+    return decode + detect
+
+def plan_analysis(probe, decode_mode='auto'):
+    """Decide whether to admit, downgrade or queue an analysis from its estimated cost"""
+    def mode_for(max_frames):
+        # Fewer samples shift the balance between seeking and scanning keyframes
+        return choose_decode_mode(probe, max_frames) if decode_mode == 'auto' else decode_mode
+
+    mode = mode_for(SAMPLED_FRAMES)
+    cost = estimate_cost(probe, mode)
+    if cost <= ADMIT_COST_SECONDS:
+        return {"action": "admit", "decodeMode": mode, "maxFrames": SAMPLED_FRAMES, "estimatedCost": cost}
+
+    def downgrades():
+        # Detecting on downscaled frames keeps every sample, so try it first
+        # when the mode is ours to pick and the frames are tall enough to shrink
+        if decode_mode == 'auto' and probe["height"] > REDUCED_MAX_HEIGHT:
+            yield 'reduced-detect', SAMPLED_FRAMES
+        for max_frames in range(SAMPLED_FRAMES - 1, DOWNGRADE_MIN_FRAMES - 1, -1):
+            yield mode_for(max_frames), max_frames
+
+    # Too expensive as requested: shrink detection or sample fewer frames until the estimate fits
+    for downgraded_mode, max_frames in downgrades():
+        downgraded_cost = estimate_cost(probe, downgraded_mode, max_frames)
+        if downgraded_cost <= ADMIT_COST_SECONDS:
+            return {
+                "action": "downgrade",
+                "decodeMode": downgraded_mode,
+                "maxFrames": max_frames,
+                "estimatedCost": downgraded_cost
+            }
+
+    # Still too expensive: run at full quality in one of the few heavy slots
+    return {"action": "queue", "decodeMode": mode, "maxFrames": SAMPLED_FRAMES, "estimatedCost": cost}
+
+def open_video(video_path, decode_mode):
+    """Open a video with the FFmpeg backend options for the given decode mode"""
+    return open_capture(video_path, DECODE_CAPTURE_OPTIONS.get(decode_mode))
+
+def downscale_frame(frame, max_height=REDUCED_MAX_HEIGHT):
+    """Shrink a frame to at most max_height rows, keeping its aspect ratio"""
+    height, width = frame.shape[:2]
+    if height <= max_height:
+        return frame
+    scale = max_height / height
+    return cv2.resize(frame, (int(width * scale), max_height), interpolation=cv2.INTER_AREA)
+
+def read_seeked_frames(cap, frame_indices):
+    """Seek to each sampled index and yield (frame_idx, frame) pairs"""
+    for frame_idx in frame_indices:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, frame_idx)
+        ret, frame = cap.read()
+
+        if ret:
+            yield frame_idx, frame
+
+def read_nearest_keyframes(cap, frame_indices, fps):
+    """Read keyframes in order and yield (frame_idx, frame) for the one nearest each sampled index
+
+    The capture must be opened with avdiscard=nonkey so each grab() decodes
+    only the next keyframe. It never seeks: OpenCV's seek counts decoded
+    frames to find its target, which overshoots when only keyframes decode.
+    """
+    targets = [idx * 1000.0 / fps for idx in frame_indices]
+    pending = 0
+    before = None  # Last keyframe read before the pending target, as (ms, frame)
+    yielded_ms = None
+
+    while pending < len(targets) and cap.grab():
+        time_ms = cap.get(cv2.CAP_PROP_POS_MSEC)
+
+        if time_ms < targets[pending]:
+            # GOPs vary (scene cuts add keyframes), so any keyframe may turn out
+            # to be the last one before the target; grab() already decoded it
+            # and retrieve() only converts it to BGR
+            ret, frame = cap.retrieve()
+            before = (time_ms, frame) if ret else None
+            continue
+
+        ret, frame = cap.retrieve()
+        after = (time_ms, frame) if ret else None
+        candidates = [c for c in (before, after) if c is not None]
+
+        while pending < len(targets) and time_ms >= targets[pending]:
+            target = targets[pending]
+            pending += 1
+            if not candidates:
+                continue
+            nearest = min(candidates, key=lambda c: abs(c[0] - target))
+            # Samples closer together than the GOP share a keyframe; use it once
+            if nearest[0] != yielded_ms:
+                yielded_ms = nearest[0]
+                yield int(round(nearest[0] * fps / 1000)), nearest[1]
+
+        before = after
+
+    # Samples after the last keyframe fall back to the last one read
+    if pending < len(targets) and before is not None and before[0] != yielded_ms:
+        yield int(round(before[0] * fps / 1000)), before[1]
+
+def read_sampled_frames(cap, frame_count, fps, decode_mode, max_frames=SAMPLED_FRAMES):
+    """Yield (frame_idx, frame) pairs sampled evenly across the video"""
+    frame_indices = sample_frame_indices(frame_count, max_frames)
+
+    if decode_mode == 'keyframe':
+        frames = read_nearest_keyframes(cap, frame_indices, fps)
+    else:
+        frames = read_seeked_frames(cap, frame_indices)
+
+    for frame_idx, frame in frames:
+        if decode_mode == 'reduced-detect':
+            frame = downscale_frame(frame)
+
+        yield frame_idx, frame
+
+def predict_video(video_path, decode_mode='auto', max_frames=SAMPLED_FRAMES, probe=None, admission=None):
     """Analyze a video for deepfakes"""
     load_model()
     
     try:
-        # Open video file
-        cap = cv2.VideoCapture(video_path)
+        # Get some video properties from the container header
+        if probe is None:
+            probe = probe_video(video_path)
         
-        if not cap.isOpened():
+        if probe is None:
             return {
                 "error": "Failed to open video file"
             }
         
-        # Get some video properties
-        frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-        fps = cap.get(cv2.CAP_PROP_FPS)
-        duration = frame_count / fps if fps > 0 else 0
+        frame_count = probe["frameCount"]
+        fps = probe["fps"]
+        
+        if decode_mode == 'auto':
+            decode_mode = choose_decode_mode(probe, max_frames)
+        elif decode_mode == 'keyframe' and fps <= 0:
+            # Keyframes are matched to samples by timestamp, which needs a frame rate
+            decode_mode = 'full'
+        
+        # Open video file with the options for the chosen decode mode
+        cap = open_video(video_path, decode_mode)
+        
+        if not cap.isOpened():
+            return {
+                "error": "Failed to open video file"
+            }
         
         # Initialize face detector
         face_detector = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
         
-        # Extract frames at regular intervals
-        frame_interval = max(1, frame_count // 20)  # Extract up to 20 frames
-        frames_to_process = range(0, frame_count, frame_interval)
-        
         predictions = []
         abnormal_frames = []
         start_time = time.time()
         
-        # Process frames
-        for frame_idx in frames_to_process:
-            cap.set(cv2.CAP_PROP_POS_FRAMES, frame_idx)
-            ret, frame = cap.read()
-            
-            if not ret:
-                continue
-                
-            # Extract faces
-            faces = extract_faces(frame, face_detector)
-            
-            if not faces:
-                continue
-                
-            # Predict on each detected face
-            for face in faces:
-                # Preprocess
-                face_rgb = cv2.cvtColor(face, cv2.COLOR_BGR2RGB)
-                face_rgb = face_rgb / 255.0  # Normalize
-                face_rgb = np.expand_dims(face_rgb, axis=0)  # Add batch dimension
-                
-                # Predict
-                prediction = model.predict(face_rgb)[0][0]
+        def record(results):
+            for idx, prediction in results:
                 predictions.append(prediction)
                 
                 # Track frames with high deepfake probability
                 if prediction > 0.7:
-                    time_in_seconds = frame_idx / fps if fps > 0 else 0
+                    time_in_seconds = idx / fps if fps > 0 else 0
                     abnormal_frames.append(int(time_in_seconds))
         
-        cap.release()
+        # Face crops are written as uint8 into a pooled buffer; scaling happens in the model
+        buffer = _batch_buffers.get()
+        try:
+            batch = FaceBatch(buffer)
+            
+            # Process up to max_frames frames extracted at regular intervals
+            for frame_idx, frame in read_sampled_frames(cap, frame_count, fps, decode_mode, max_frames):
+                # Extract faces
+                faces = extract_faces(frame, face_detector)
+                
+                if not faces:
+                    continue
+                    
+                # Queue each detected face, predicting whenever the batch fills up
+                for face in faces:
+                    batch.add(face, frame_idx)
+                    if batch.is_full():
+                        record(batch.flush())
+            
+            record(batch.flush())
+        finally:
+            _batch_buffers.put(buffer)
+            cap.release()
         
         # Calculate overall confidence
         if not predictions:
@@ -354,9 +779,14 @@ def predict_video(video_path):
             "techniques": techniques,
             "processedAt": datetime.now().isoformat(),
             "processingTime": processing_time,
+            "decodeMode": decode_mode,
+            "probe": probe,
             "modelUsed": model_info
         }
         
+        if admission is not None:
+            result["admission"] = admission
+        
         # Save result to file
         result_id = str(uuid.uuid4())
         result_path = os.path.join(RESULT_FOLDER, f"{result_id}.json")
@@ -466,14 +896,47 @@ def analyze_video():
     if not allowed_file(file.filename):
         return jsonify({"error": f"Invalid file type. Allowed types: {', '.join(ALLOWED_EXTENSIONS)}"}), 400
         
+    # Optional per-request override of the automatic decode mode
+    decode_mode = request.form.get('decodeMode', 'auto')
+    if decode_mode not in DECODE_MODES:
+        return jsonify({"error": f"Invalid decode mode. Allowed modes: {', '.join(DECODE_MODES)}"}), 400
+        
     try:
+        # Reject uploads that aren't a known container before paying for the save
+        header = file.stream.read(UPLOAD_HEADER_BYTES)
+        file.stream.seek(0)
+        if not has_known_signature(header):
+            return jsonify({"error": "Unsupported or corrupt video file"}), 400
+        
         # Save uploaded file
         filename = str(uuid.uuid4()) + '.' + file.filename.rsplit('.', 1)[1].lower()
         file_path = os.path.join(UPLOAD_FOLDER, filename)
         file.save(file_path)
         
-        # Analyze video
-        result = predict_video(file_path)
+        # Probe the container header and reject files OpenCV can't read
+        probe = probe_video(file_path)
+        if probe is None:
+            os.remove(file_path)
+            return jsonify({"error": "Unsupported or corrupt video file"}), 400
+        
+        # Admit, downgrade or queue based on the estimated cost; every analysis
+        # then waits for a slot, cheapest first, and gives up after a deadline
+        plan = plan_analysis(probe, decode_mode)
+        heavy = plan["action"] == "queue"
+        if not analysis_queue.acquire(plan["estimatedCost"], heavy=heavy):
+            os.remove(file_path)
+            return jsonify({"error": "Server is busy, please try again later"}), 503
+        
+        try:
+            result = predict_video(
+                file_path,
+                decode_mode=plan["decodeMode"],
+                max_frames=plan["maxFrames"],
+                probe=probe,
+                admission=plan
+            )
+        finally:
+            analysis_queue.release(heavy=heavy)
         
         # Clean up uploaded file (optional)
         # os.remove(file_path)
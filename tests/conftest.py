@@ -0,0 +1,52 @@
+import os
+import sys
+import tempfile
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# The API creates its upload, result and generation folders in the working
+# directory on import, so keep them out of the checkout
+os.chdir(tempfile.mkdtemp(prefix="deepfake-api-tests-"))
+
+import deepfake_detection_api as api
+
+
+class StubModel:
+    """Predicts the first red value of each crop so results can be traced to slots"""
+
+    def __init__(self):
+        self.batches = []
+
+    def predict_on_batch(self, batch):
+        self.batches.append(batch)
+        return batch[:, 0, 0, :1] / 255.0
+
+
+@pytest.fixture
+def stub_model(monkeypatch):
+    stub = StubModel()
+    monkeypatch.setattr(api, "model", stub)
+    monkeypatch.setattr(api, "model_input_scale", None)
+    return stub
+
+
+def write_video(path, frames=50, size=(64, 48), fps=25):
+    """Write an mp4v clip of a slowly moving gradient and return its path"""
+    writer = api.cv2.VideoWriter(str(path), api.cv2.VideoWriter_fourcc(*'mp4v'), fps, size)
+    gradient = np.tile(np.linspace(0, 255, size[0], dtype=np.uint8), (size[1], 1))
+    for i in range(frames):
+        # Slow motion keeps the encoder from adding scene-change keyframes
+        writer.write(api.cv2.merge([np.roll(gradient, i, axis=1), gradient, gradient]))
+    writer.release()
+    return str(path)
+
+
+def make_probe(frame_count, gop=250, height=480, codec="h264", fps=25):
+    """Probe result for a 16:9 video, as returned by probe_video"""
+    return {
+        "codec": codec, "frameCount": frame_count, "fps": fps, "duration": frame_count / fps if fps > 0 else 0,
+        "width": height * 16 // 9, "height": height, "gopFrames": gop
+    }
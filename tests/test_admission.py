@@ -0,0 +1,212 @@
+import glob
+import io
+import json
+import os
+import threading
+import time
+
+import pytest
+from werkzeug.datastructures import FileStorage
+
+import deepfake_detection_api as api
+from conftest import make_probe, write_video
+
+MINUTE = 60 * 25  # Frames in a minute at make_probe's default frame rate
+
+
+def test_cost_grows_with_duration_gop_and_codec():
+    short = make_probe(10 * MINUTE, height=720)
+    long = make_probe(60 * MINUTE, height=720)
+    assert api.estimate_cost(long, 'keyframe') > api.estimate_cost(short, 'keyframe')
+
+    assert api.estimate_cost(make_probe(10 * MINUTE, gop=250, height=720), 'full') > \
+        api.estimate_cost(make_probe(10 * MINUTE, gop=12, height=720), 'full')
+
+    assert api.estimate_cost(make_probe(10 * MINUTE, codec="hevc", height=720), 'full') > \
+        api.estimate_cost(make_probe(10 * MINUTE, codec="mp4v", height=720), 'full')
+
+
+def test_plan_admits_typical_upload():
+    plan = api.plan_analysis(make_probe(10 * MINUTE, height=1080))
+
+    assert plan["action"] == "admit"
+    assert plan["decodeMode"] == 'keyframe'
+    assert plan["maxFrames"] == api.SAMPLED_FRAMES
+    assert plan["estimatedCost"] <= api.ADMIT_COST_SECONDS
+
+
+def test_plan_downgrades_sampling_when_over_budget():
+    plan = api.plan_analysis(make_probe(10 * MINUTE, height=1080), decode_mode='full')
+
+    assert plan["action"] == "downgrade"
+    assert plan["decodeMode"] == 'full'
+    assert api.DOWNGRADE_MIN_FRAMES <= plan["maxFrames"] < api.SAMPLED_FRAMES
+    assert plan["estimatedCost"] <= api.ADMIT_COST_SECONDS
+
+
+def test_plan_downgrades_to_reduced_detection_before_dropping_frames():
+    probe = make_probe(2 * MINUTE, gop=12, height=1440)
+    assert api.estimate_cost(probe, 'full') > api.ADMIT_COST_SECONDS
+
+    plan = api.plan_analysis(probe)
+
+    assert plan["action"] == "downgrade"
+    assert plan["decodeMode"] == 'reduced-detect'
+    assert plan["maxFrames"] == api.SAMPLED_FRAMES
+    assert plan["estimatedCost"] <= api.ADMIT_COST_SECONDS
+
+
+def test_plan_never_picks_reduced_detection_for_explicit_mode():
+    plan = api.plan_analysis(make_probe(2 * MINUTE, gop=12, height=1440), decode_mode='full')
+
+    assert plan["decodeMode"] == 'full'
+    assert plan["maxFrames"] < api.SAMPLED_FRAMES
+
+
+def test_plan_queues_multi_hour_4k_upload():
+    plan = api.plan_analysis(make_probe(180 * MINUTE, height=2160))
+
+    assert plan["action"] == "queue"
+    assert plan["maxFrames"] == api.SAMPLED_FRAMES
+    assert plan["estimatedCost"] > api.ADMIT_COST_SECONDS
+
+
+def start_waiter(queue, cost, order, name, heavy=False, timeout=5):
+    def run():
+        if queue.acquire(cost, heavy=heavy, timeout=timeout):
+            order.append(name)
+            queue.release(heavy=heavy)
+
+    waiting = len(queue._waiting)
+    thread = threading.Thread(target=run)
+    thread.start()
+    while len(queue._waiting) == waiting:
+        time.sleep(0.001)
+    return thread
+
+
+def test_queue_bounds_concurrency_and_times_out():
+    queue = api.AnalysisQueue(slots=2, heavy_slots=1, max_waiting=4)
+    assert queue.acquire(1)
+    assert queue.acquire(1)
+
+    assert not queue.acquire(1, timeout=0.05)
+    assert queue._waiting == []
+
+    queue.release()
+    assert queue.acquire(1, timeout=0.05)
+
+
+def test_queue_rejects_when_full():
+    queue = api.AnalysisQueue(slots=1, heavy_slots=1, max_waiting=1)
+    assert queue.acquire(1)
+    order = []
+    thread = start_waiter(queue, 1, order, "waiting")
+
+    assert not queue.acquire(1, timeout=5)
+
+    queue.release()
+    thread.join()
+    assert order == ["waiting"]
+
+
+def test_queue_runs_cheapest_first():
+    queue = api.AnalysisQueue(slots=1, heavy_slots=1, max_waiting=4)
+    assert queue.acquire(0)
+    order = []
+    threads = [start_waiter(queue, 50, order, "expensive"), start_waiter(queue, 1, order, "cheap")]
+
+    queue.release()
+    for thread in threads:
+        thread.join()
+
+    assert order == ["cheap", "expensive"]
+
+
+def test_queue_does_not_let_later_cheap_work_starve_earlier_job():
+    queue = api.AnalysisQueue(slots=1, heavy_slots=1, max_waiting=4)
+    assert queue.acquire(0)
+    order = []
+    threads = [start_waiter(queue, 0.1, order, "earlier")]
+    time.sleep(0.3)
+    threads.append(start_waiter(queue, 0.01, order, "later"))
+
+    queue.release()
+    for thread in threads:
+        thread.join()
+
+    assert order == ["earlier", "later"]
+
+
+def test_queue_limits_heavy_analyses_but_not_light_ones():
+    queue = api.AnalysisQueue(slots=3, heavy_slots=1, max_waiting=4)
+    assert queue.acquire(100, heavy=True)
+
+    assert not queue.acquire(100, heavy=True, timeout=0.05)
+    assert queue.acquire(1, timeout=0.05)
+
+
+@pytest.fixture
+def client(stub_model, monkeypatch):
+    monkeypatch.setattr(api, "analysis_queue", api.AnalysisQueue(1, 1, 2))
+    return api.app.test_client()
+
+
+def test_known_signatures(tmp_path):
+    with open(write_video(tmp_path / "clip.mp4"), "rb") as f:
+        assert api.has_known_signature(f.read(api.UPLOAD_HEADER_BYTES))
+    assert api.has_known_signature(b"RIFF\x00\x00\x00\x00AVI ")
+    assert api.has_known_signature(api.EBML_MAGIC + b"\x01\x00")
+    assert not api.has_known_signature(b"RIFF\x00\x00\x00\x00WAVE")
+    assert not api.has_known_signature(b"not a video")
+    assert not api.has_known_signature(b"")
+
+
+def test_analyze_rejects_non_video_upload_before_saving(client, monkeypatch):
+    def fail(*args, **kwargs):
+        raise AssertionError("upload was saved")
+
+    monkeypatch.setattr(FileStorage, "save", fail)
+
+    response = client.post("/api/analyze", data={"video": (io.BytesIO(b"not a video"), "clip.mp4")})
+
+    assert response.status_code == 400
+    assert "corrupt" in response.get_json()["error"]
+
+
+def test_analyze_rejects_corrupt_upload(client):
+    before = set(os.listdir(api.UPLOAD_FOLDER))
+    truncated = b"\x00\x00\x00\x18ftypmp42" + b"\x00" * 64
+
+    response = client.post("/api/analyze", data={"video": (io.BytesIO(truncated), "clip.mp4")})
+
+    assert response.status_code == 400
+    assert "corrupt" in response.get_json()["error"]
+    assert set(os.listdir(api.UPLOAD_FOLDER)) == before
+
+
+def test_analyze_returns_503_when_no_slot_frees_up(client, tmp_path, monkeypatch):
+    monkeypatch.setattr(api.analysis_queue, "acquire", lambda cost, heavy=False: False)
+    video = write_video(tmp_path / "clip.mp4")
+
+    with open(video, "rb") as f:
+        response = client.post("/api/analyze", data={"video": (f, "clip.mp4")})
+
+    assert response.status_code == 503
+
+
+def test_analyze_persists_probe_and_admission(client, tmp_path):
+    video = write_video(tmp_path / "clip.mp4")
+
+    with open(video, "rb") as f:
+        response = client.post("/api/analyze", data={"video": (f, "clip.mp4")})
+
+    result = response.get_json()
+    assert response.status_code == 200
+    assert result["admission"]["action"] == "admit"
+    assert result["probe"]["frameCount"] == 50
+
+    saved = max(glob.glob(os.path.join(api.RESULT_FOLDER, "*.json")), key=os.path.getmtime)
+    with open(saved) as f:
+        assert json.load(f)["admission"] == result["admission"]
+    assert api.analysis_queue._running == 0
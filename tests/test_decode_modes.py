@@ -0,0 +1,176 @@
+import os
+
+import numpy as np
+import pytest
+
+import deepfake_detection_api as api
+from conftest import make_probe, write_video
+
+
+class FakeKeyframeCapture:
+    """Capture that yields only the given keyframe timestamps, like avdiscard=nonkey"""
+
+    def __init__(self, keyframe_ms):
+        self.keyframe_ms = keyframe_ms
+        self.position = -1
+        self.retrieved = 0
+        self.seeks = 0
+
+    def grab(self):
+        self.position += 1
+        return self.position < len(self.keyframe_ms)
+
+    def retrieve(self):
+        self.retrieved += 1
+        return True, np.full((4, 4, 3), self.position, dtype=np.uint8)
+
+    def get(self, prop):
+        assert prop == api.cv2.CAP_PROP_POS_MSEC
+        return self.keyframe_ms[self.position]
+
+    def set(self, prop, value):
+        self.seeks += 1
+        return True
+
+
+class FakeSeekCapture:
+    def __init__(self, frame_count):
+        self.frame_count = frame_count
+        self.position = 0
+        self.visited = []
+
+    def set(self, prop, value):
+        assert prop == api.cv2.CAP_PROP_POS_FRAMES
+        self.position = int(value)
+        return True
+
+    def read(self):
+        self.visited.append(self.position)
+        return self.position < self.frame_count, np.zeros((4, 4, 3), dtype=np.uint8)
+
+
+@pytest.mark.parametrize("frame_count", [1, 19, 39, 40, 1000, 15001])
+def test_sampled_frame_count_matches_read_sampled_frames(frame_count):
+    cap = FakeSeekCapture(frame_count)
+
+    frames = list(api.read_sampled_frames(cap, frame_count, 25, 'full'))
+
+    assert cap.visited == list(api.sample_frame_indices(frame_count))
+    assert len(frames) == api.sampled_frame_count(frame_count, api.SAMPLED_FRAMES)
+
+
+def test_keyframe_reading_never_seeks_and_keeps_every_sample():
+    # 10 minutes at 25 fps with a keyframe every 10 s, sampled every 30 s
+    keyframes = [i * 10000.0 for i in range(60)]
+    cap = FakeKeyframeCapture(keyframes)
+    indices = api.sample_frame_indices(15000)
+
+    frames = list(api.read_nearest_keyframes(cap, indices, fps=25))
+
+    assert cap.seeks == 0
+    assert [idx for idx, _ in frames] == list(indices)
+
+
+def test_keyframe_reading_picks_nearest_keyframe():
+    cap = FakeKeyframeCapture([0.0, 1000.0, 2000.0, 3000.0])
+
+    frames = list(api.read_nearest_keyframes(cap, [0, 22, 28, 52], fps=25))
+
+    # 880 ms -> 1000, 1120 ms is nearer 1000 (already used), 2080 ms -> 2000
+    assert [idx for idx, _ in frames] == [0, 25, 50]
+    assert [int(frame[0, 0, 0]) for _, frame in frames] == [0, 1, 2]
+
+
+def test_keyframe_reading_falls_back_to_last_keyframe():
+    cap = FakeKeyframeCapture([0.0, 4000.0])
+
+    frames = list(api.read_nearest_keyframes(cap, [0, 50, 150], fps=25))
+
+    assert [idx for idx, _ in frames] == [0, 100]
+
+
+def test_keyframe_reading_picks_nearest_keyframe_with_variable_gop():
+    # Scene cuts add keyframes at 2200 and 2400 ms inside a 1 s GOP
+    cap = FakeKeyframeCapture([0.0, 1000.0, 2000.0, 2200.0, 2400.0, 5000.0])
+
+    frames = list(api.read_nearest_keyframes(cap, [0, 72], fps=25))
+
+    # 2880 ms -> 2400, not the 2000 ms keyframe that started the GOP
+    assert [idx for idx, _ in frames] == [0, 60]
+    assert [int(frame[0, 0, 0]) for _, frame in frames] == [0, 4]
+
+
+def test_keyframe_reading_falls_back_to_last_keyframe_read():
+    cap = FakeKeyframeCapture([0.0, 1000.0, 2000.0, 2100.0])
+
+    frames = list(api.read_nearest_keyframes(cap, [0, 75], fps=25))
+
+    assert [idx for idx, _ in frames] == [0, 52]
+    assert int(frames[-1][1][0, 0, 0]) == 3
+
+
+def test_keyframe_mode_reads_real_keyframes(tmp_path):
+    # OpenCV's mp4v writer puts a keyframe every 12 frames
+    video = write_video(tmp_path / "clip.mp4", frames=600)
+    probe = api.probe_video(video)
+    assert probe["gopFrames"] == 12
+
+    cap = api.open_video(video, 'keyframe')
+    frames = list(api.read_sampled_frames(cap, probe["frameCount"], probe["fps"], 'keyframe'))
+    cap.release()
+
+    assert len(frames) == api.sampled_frame_count(600, api.SAMPLED_FRAMES)
+    assert all(idx % 12 == 0 for idx, _ in frames)
+    for (idx, _), target in zip(frames, api.sample_frame_indices(600)):
+        assert abs(idx - target) <= 6
+
+
+def test_open_capture_holds_lock_and_isolates_options(monkeypatch):
+    seen = []
+
+    def fake_capture(path, *args):
+        seen.append((api._capture_options_lock.locked(), os.environ.get(api.CAPTURE_OPTIONS_ENV)))
+        return object()
+
+    monkeypatch.setattr(api.cv2, "VideoCapture", fake_capture)
+    monkeypatch.setenv(api.CAPTURE_OPTIONS_ENV, "rtsp_transport;tcp")
+
+    api.open_video("clip.mp4", 'keyframe')
+    api.open_video("clip.mp4", 'full')
+    api.open_capture("clip.mp4")
+
+    assert seen == [(True, "avdiscard;nonkey"), (True, None), (True, None)]
+    assert os.environ[api.CAPTURE_OPTIONS_ENV] == "rtsp_transport;tcp"
+
+
+def test_probe_video_opens_through_lock(monkeypatch):
+    seen = []
+
+    class ClosedCapture:
+        def isOpened(self):
+            return False
+
+        def release(self):
+            pass
+
+    def fake_capture(path, *args):
+        seen.append(api._capture_options_lock.locked())
+        return ClosedCapture()
+
+    monkeypatch.setattr(api.cv2, "VideoCapture", fake_capture)
+
+    assert api.probe_video("clip.mp4") is None
+    assert seen == [True]
+
+
+def test_choose_decode_mode():
+    # An hour with 10 s GOPs: scanning 360 keyframes beats 20 long seeks
+    assert api.choose_decode_mode(make_probe(90000, 250)) == 'keyframe'
+    # Short GOPs make seeking cheap even for long videos
+    assert api.choose_decode_mode(make_probe(90000, 12)) == 'full'
+    # Resolution alone never lowers the detection size
+    assert api.choose_decode_mode(make_probe(90000, 12, height=1080)) == 'full'
+    # Fewer keyframes than samples would drop samples
+    assert api.choose_decode_mode(make_probe(2000, 250)) == 'full'
+    # Without a frame rate keyframes can't be matched to samples
+    assert api.choose_decode_mode(make_probe(90000, 250, fps=0)) == 'full'
@@ -0,0 +1,140 @@
+import numpy as np
+import pytest
+
+import deepfake_detection_api as api
+from conftest import write_video
+
+
+def solid_bgr(blue, green, red, size=(60, 80)):
+    image = np.empty(size + (3,), dtype=np.uint8)
+    image[:] = (blue, green, red)
+    return image
+
+
+def make_buffer(slots):
+    return np.zeros((slots, api.IMAGE_SIZE[1], api.IMAGE_SIZE[0], 3), dtype=np.uint8)
+
+
+def test_add_resizes_into_slot_as_rgb():
+    buffer = make_buffer(2)
+    batch = api.FaceBatch(buffer)
+
+    batch.add(solid_bgr(10, 20, 30), frame_idx=7)
+
+    assert buffer.dtype == np.uint8
+    assert (buffer[0] == (30, 20, 10)).all()
+    assert (buffer[1] == 0).all()
+    assert batch.frame_indices == [7]
+
+
+def test_add_accepts_crop_views():
+    frame = solid_bgr(0, 0, 0, size=(200, 300))
+    frame[50:150, 100:200] = (1, 2, 3)
+    buffer = make_buffer(1)
+
+    api.FaceBatch(buffer).add(frame[50:150, 100:200], frame_idx=0)
+
+    assert (buffer[0] == (3, 2, 1)).all()
+
+
+def test_flush_keeps_insertion_order(stub_model):
+    batch = api.FaceBatch(make_buffer(4))
+    for frame_idx, red in [(5, 50), (3, 30), (9, 90)]:
+        batch.add(solid_bgr(0, 0, red), frame_idx)
+
+    results = batch.flush()
+
+    assert [idx for idx, _ in results] == [5, 3, 9]
+    assert [round(float(p) * 255) for _, p in results] == [50, 30, 90]
+
+
+def test_flush_predicts_partial_batch_only(stub_model):
+    batch = api.FaceBatch(make_buffer(4))
+    batch.add(solid_bgr(0, 0, 1), 0)
+    batch.add(solid_bgr(0, 0, 2), 1)
+
+    assert not batch.is_full()
+    batch.flush()
+
+    assert len(stub_model.batches) == 1
+    assert stub_model.batches[0].shape[0] == 2
+    assert stub_model.batches[0].dtype == np.uint8
+    assert batch.frame_indices == []
+    assert batch.flush() == []
+    assert len(stub_model.batches) == 1
+
+
+def test_is_full_at_buffer_capacity(stub_model):
+    batch = api.FaceBatch(make_buffer(2))
+    batch.add(solid_bgr(0, 0, 1), 0)
+    batch.add(solid_bgr(0, 0, 2), 1)
+
+    assert batch.is_full()
+    assert len(batch.flush()) == 2
+    assert not batch.is_full()
+
+
+def test_flush_scales_on_host_when_model_is_unwrapped(stub_model, monkeypatch):
+    monkeypatch.setattr(api, "model_input_scale", 1.0 / 255)
+    batch = api.FaceBatch(make_buffer(1))
+    batch.add(solid_bgr(0, 0, 255), 0)
+
+    batch.flush()
+
+    fed = stub_model.batches[0]
+    assert fed.dtype == np.float32
+    assert fed.max() == pytest.approx(1.0)
+
+
+def test_with_rescaling_wraps_unscaled_model():
+    keras = api.tf.keras
+    inner = keras.Sequential([
+        keras.Input(shape=(api.IMAGE_SIZE[1], api.IMAGE_SIZE[0], 3)),
+        keras.layers.GlobalAveragePooling2D()
+    ])
+
+    wrapped = api.with_rescaling(inner)
+
+    assert isinstance(wrapped.layers[0], keras.layers.Rescaling)
+    pixels = np.full((1, api.IMAGE_SIZE[1], api.IMAGE_SIZE[0], 3), 255, dtype=np.uint8)
+    assert np.allclose(wrapped.predict_on_batch(pixels), 1.0)
+    assert api.with_rescaling(wrapped) is wrapped
+
+
+def test_load_model_keeps_trained_model_when_wrapping_fails(monkeypatch):
+    trained = object()
+    monkeypatch.setattr(api, "model", None)
+    monkeypatch.setattr(api, "model_input_scale", None)
+    monkeypatch.setattr(api.tf.keras.models, "load_model", lambda path: trained)
+
+    def fail(loaded_model):
+        raise ValueError("cannot wrap")
+
+    monkeypatch.setattr(api, "with_rescaling", fail)
+
+    assert api.load_model() is trained
+    assert api.model_input_scale == pytest.approx(1.0 / 255)
+
+
+def test_predict_video_returns_buffer_to_pool(stub_model, tmp_path):
+    pool = {id(buffer) for buffer in list(api._batch_buffers.queue)}
+    video = write_video(tmp_path / "clip.mp4")
+
+    for _ in range(api.BATCH_BUFFER_POOL_SIZE + 1):
+        result = api.predict_video(video, decode_mode='full')
+        assert "error" not in result
+
+    assert api._batch_buffers.qsize() == api.BATCH_BUFFER_POOL_SIZE
+    assert {id(batch.base) for batch in stub_model.batches} <= pool
+
+
+def test_predict_video_returns_buffer_on_error(stub_model, tmp_path, monkeypatch):
+    video = write_video(tmp_path / "clip.mp4")
+
+    def fail(image, face_detector):
+        raise RuntimeError("detector crashed")
+
+    monkeypatch.setattr(api, "extract_faces", fail)
+
+    assert "error" in api.predict_video(video, decode_mode='full')
+    assert api._batch_buffers.qsize() == api.BATCH_BUFFER_POOL_SIZE